@@ -1,13 +1,28 @@
+import matplotlib
+# Non-interactive backend: the plots are only written to disk
+matplotlib.use('Agg')
+matplotlib.rcParams['font.family'] = 'DejaVu Sans'
+import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
-import seaborn as sns
 from entsoe import EntsoePandasClient
+from concurrent.futures import ThreadPoolExecutor
 from datetime import timedelta
 import logging
 from pathlib import Path
 import sys
 from typing import Dict, List, Optional, Tuple
 
+try:
+    from numba import njit
+except ImportError:  # numba is optional; aggregation falls back to pandas
+    njit = None
+
+try:
+    import requests_cache
+except ImportError:  # requests_cache is optional; responses are not cached
+    requests_cache = None
+
 # Set up logging
 logging.basicConfig(
     level=logging.INFO,
@@ -15,6 +30,30 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Simplify area polygon paths aggressively; the plots are only saved to disk
+plt.rcParams['path.simplify_threshold'] = 1.0
+plt.ioff()
+
+if njit is not None:
+    @njit(cache=True)
+    def _agg_kernel(values, col_idx, group_offsets, out):
+        """
+        Sum the columns of each group; group g uses col_idx[offsets[g]:offsets[g + 1]].
+        NaNs are skipped, but a group with no valid readings stays NaN.
+        """
+        for i in range(values.shape[0]):
+            for g in range(group_offsets.shape[0] - 1):
+                s = 0.0
+                n_valid = 0
+                for k in range(group_offsets[g], group_offsets[g + 1]):
+                    v = values[i, col_idx[k]]
+                    if not np.isnan(v):
+                        s += v
+                        n_valid += 1
+                out[i, g] = s if n_valid > 0 else np.nan
+else:
+    _agg_kernel = None
+
 class EnergyDataAnalyzer:
     """
     Analyzes energy generation data from multiple European countries.
@@ -23,7 +62,17 @@ class EnergyDataAnalyzer:
     
     def __init__(self, api_key: str):
         """Initialize with ENTSO-E API key."""
-        self.client = EntsoePandasClient(api_key=api_key)
+        session = None
+        if requests_cache is not None:
+            # Cache API responses on disk so re-runs skip the round-trip;
+            # the API key (securityToken) is kept out of the cached requests
+            session = requests_cache.CachedSession(
+                '.entsoe_cache',
+                expire_after=3600,
+                backend='sqlite',
+                ignored_parameters=['securityToken']
+            )
+        self.client = EntsoePandasClient(api_key=api_key, session=session)
         self.countries = {
             'FR': 'France',
             'DE_LU': 'Germany/Luxembourg',
@@ -70,10 +119,26 @@ class EnergyDataAnalyzer:
             ]
         }
 
-    def find_latest_data_date(self, country_code: str) -> Optional[pd.Timestamp]:
+        # Inverted aggregation mapping: source column -> group name
+        self._col_to_group = {
+            src: grp for grp, srcs in self.agg_map.items() for src in srcs
+        }
+
+        # Column-index layouts for the aggregation kernel, keyed by columns
+        self._agg_layouts = {}
+
+        # Plot figure, created on first use and cleared for each plot
+        self._fig = None
+
+    def find_latest_data_date(
+        self,
+        country_code: str
+    ) -> Tuple[Optional[pd.Timestamp], Optional[pd.DataFrame]]:
         """
         Find the most recent date with available data for a country.
-        Returns None if no data is found within the search period.
+        Returns the latest timestamp together with the queried data, so
+        callers can slice it instead of querying the API again.
+        Returns (None, None) if no data is found within the search period.
         """
         end = pd.Timestamp.now(tz='Europe/Brussels')
         start = end - timedelta(days=30)  # Look back 30 days
@@ -85,34 +150,48 @@ class EnergyDataAnalyzer:
                 end=end
             )
             if not df.empty:
-                return df.index[-1]
-            return None
+                return df.index[-1], df
+            return None, None
         except Exception as e:
             logger.warning(f"Error finding latest data for {country_code}: {e}")
-            return None
+            return None, None
 
     def aggregate_sources(self, df_gen: pd.DataFrame) -> pd.DataFrame:
         """Aggregate generation sources according to predefined mapping."""
-        df_agg = pd.DataFrame(index=df_gen.index)
-        
-        for col in df_gen.columns:
-            found_group = None
-            for group_name, source_list in self.agg_map.items():
-                if col in source_list:
-                    found_group = group_name
-                    break
-
-            if found_group:
-                if found_group not in df_agg.columns:
-                    df_agg[found_group] = 0.0
-                df_agg[found_group] += df_gen[col]
-            else:
-                if col not in df_agg.columns:
-                    df_agg[col] = df_gen[col]
-                else:
-                    df_agg[col] += df_gen[col]
-        
-        return df_agg
+        if _agg_kernel is None:
+            mapper = {col: self._col_to_group.get(col, col) for col in df_gen.columns}
+            # Group along the columns; unmapped sources keep their own name.
+            # min_count=1 keeps missing readings as NaN instead of 0 MW.
+            return df_gen.T.groupby(mapper, sort=False).sum(min_count=1).T
+
+        key = tuple(df_gen.columns)
+        layout = self._agg_layouts.get(key)
+        if layout is None:
+            layout = self._build_agg_layout(df_gen.columns)
+            self._agg_layouts[key] = layout
+        groups, col_idx, group_offsets = layout
+
+        values = df_gen.to_numpy(dtype=np.float64)
+        out = np.empty((values.shape[0], len(groups)))
+        _agg_kernel(values, col_idx, group_offsets, out)
+        return pd.DataFrame(out, index=df_gen.index, columns=groups)
+
+    def _build_agg_layout(
+        self,
+        columns: pd.Index
+    ) -> Tuple[List[str], np.ndarray, np.ndarray]:
+        """
+        Build the group names and flattened per-group column indices used by
+        the aggregation kernel. Groups keep their first-appearance order.
+        """
+        group_cols: Dict[str, List[int]] = {}
+        for i, col in enumerate(columns):
+            group_cols.setdefault(self._col_to_group.get(col, col), []).append(i)
+
+        groups = list(group_cols)
+        col_idx = np.array([i for cols in group_cols.values() for i in cols], dtype=np.intp)
+        group_offsets = np.cumsum([0] + [len(cols) for cols in group_cols.values()]).astype(np.intp)
+        return groups, col_idx, group_offsets
 
     def create_generation_plot(
         self, 
@@ -126,27 +205,34 @@ class EnergyDataAnalyzer:
         Returns True if successful, False otherwise.
         """
         """Create and save a stacked area plot for generation data."""
-        num_cols = len(df_agg.columns)
-        palette = sns.color_palette("tab20", n_colors=num_cols)
+        # Fixed color per source, grey for sources without one
+        colors = [self.color_map.get(col, self.color_map['Other']) for col in df_agg.columns]
 
-        plt.figure(figsize=(15, 8))
-        ax = plt.gca()
+        # Fresh Axes per plot: ax.clear() does not reset the time-series
+        # state pandas keeps on the Axes, so earlier data would be redrawn
+        if self._fig is None:
+            self._fig = plt.figure(figsize=(15, 8))
+        else:
+            self._fig.clf()
+        ax = self._fig.add_subplot()
 
         df_agg.plot.area(
             ax=ax,
             title=f"{country_name} Power Generation Mix\n{df_agg.index[0].strftime('%Y-%m-%d')} to {df_agg.index[-1].strftime('%Y-%m-%d')}",
-            color=palette
+            color=colors
         )
         
         ax.set_xlabel("Time")
         ax.set_ylabel("Power [MW]")
 
-        # Add day boundary lines
-        for day in pd.date_range(df_agg.index[0], df_agg.index[-1], freq='D'):
-            ax.axvline(day, color='gray', linestyle='--', linewidth=0.5, alpha=0.5)
+        # Add day boundary lines as a single collection; freeze the y-range
+        # first so the lines span the plotted data
+        days = pd.date_range(df_agg.index[0], df_agg.index[-1], freq='D')
+        ax.set_ylim(ax.get_ylim())
+        ax.vlines(days, *ax.get_ylim(), colors='gray', linestyles='--', linewidth=0.5, alpha=0.5)
 
-        plt.legend(loc='center left', bbox_to_anchor=(1.05, 0.5))
-        plt.tight_layout()
+        ax.legend(loc='center left', bbox_to_anchor=(1.05, 0.5))
+        self._fig.tight_layout()
         
         # Save the plot
         try:
@@ -158,8 +244,12 @@ class EnergyDataAnalyzer:
             filepath = output_path / filename
             
             # Save the plot
-            plt.savefig(filepath, bbox_inches='tight', dpi=300)
-            plt.close()
+            self._fig.savefig(
+                filepath,
+                bbox_inches='tight',
+                dpi=150,
+                pil_kwargs={'optimize': False, 'compress_level': 1}
+            )
             
             # Verify the file was created
             if filepath.exists():
@@ -171,28 +261,68 @@ class EnergyDataAnalyzer:
                 
         except Exception as e:
             logger.error(f"Error saving plot for {country_name}: {e}")
-            plt.close()
             return False
 
+    def close(self) -> None:
+        """Close the plot figure, if one was created."""
+        if self._fig is not None:
+            plt.close(self._fig)
+            self._fig = None
+
     def calculate_statistics(self, df_agg: pd.DataFrame) -> Dict:
         """Calculate key statistics from the generation data."""
         # Calculate total generation
-        total_generation = df_agg.sum(axis=1)
+        totals = np.nansum(df_agg.to_numpy(dtype=np.float32), axis=1)
         
         # Convert to daily data for some metrics
-        daily_generation = total_generation.resample('D').mean()
+        daily_generation = self._daily_means(totals, df_agg.index)
+        if len(daily_generation) > 1:
+            daily_volatility = float(daily_generation.std(ddof=1) / daily_generation.mean() * 100)  # CV as percentage
+        else:
+            daily_volatility = float('nan')
         
         stats = {
-            'max_power_mw': total_generation.max(),
-            'min_power_mw': total_generation.min(),
-            'avg_power_mw': total_generation.mean(),
-            'daily_volatility': daily_generation.std() / daily_generation.mean() * 100,  # CV as percentage
-            'peak_hour': total_generation.idxmax().strftime('%Y-%m-%d %H:%M'),
-            'trough_hour': total_generation.idxmin().strftime('%Y-%m-%d %H:%M')
+            'max_power_mw': float(totals.max()),
+            'min_power_mw': float(totals.min()),
+            'avg_power_mw': float(totals.mean()),
+            'daily_volatility': daily_volatility,
+            'peak_hour': df_agg.index[np.argmax(totals)].strftime('%Y-%m-%d %H:%M'),
+            'trough_hour': df_agg.index[np.argmin(totals)].strftime('%Y-%m-%d %H:%M')
         }
         
         return stats
 
+    def _daily_means(self, totals: np.ndarray, index: pd.DatetimeIndex) -> np.ndarray:
+        """
+        Calendar-day means of the total generation, equivalent to
+        resample('D').mean(). Reshapes the samples between the first and
+        last midnight when the index is a gap-free grid that does not cross
+        a DST change; otherwise falls back to resample.
+        """
+        day = pd.Timedelta(days=1)
+        if len(index) > 1:
+            step = index[1] - index[0]
+            regular = (
+                step > pd.Timedelta(0)
+                and day % step == pd.Timedelta(0)
+                and len(index) == (index[-1] - index[0]) // step + 1
+                and index[0].utcoffset() == index[-1].utcoffset()
+            )
+            if regular:
+                samples_per_day = day // step
+                # Partial days before the first and after the last midnight
+                head = min((index[0].ceil('D') - index[0]) // step, len(totals))
+                n_days = (len(totals) - head) // samples_per_day
+                tail = head + n_days * samples_per_day
+
+                daily = [totals[:head].mean()] if head else []
+                daily.extend(totals[head:tail].reshape(n_days, samples_per_day).mean(axis=1))
+                if tail < len(totals):
+                    daily.append(totals[tail:].mean())
+                return np.array(daily)
+
+        return pd.Series(totals, index=index).resample('D').mean().to_numpy()
+
     def check_data_quality(self, df_agg: pd.DataFrame) -> List[str]:
         """Check for potential data quality issues."""
         issues = []
@@ -202,17 +332,21 @@ class EnergyDataAnalyzer:
         mean_generation = total_generation.mean()
         low_threshold = mean_generation * 0.2  # 20% of mean
         
-        low_periods = total_generation[total_generation < low_threshold]
-        if not low_periods.empty:
-            issues.append(f"Found unusually low generation periods: {low_periods.index.strftime('%Y-%m-%d %H:%M').tolist()}")
+        low_mask = total_generation.lt(low_threshold)
+        if low_mask.any():
+            low_periods = total_generation.index[low_mask.to_numpy()]
+            issues.append(f"Found unusually low generation periods: {low_periods.strftime('%Y-%m-%d %H:%M').tolist()}")
         
-        # Check for missing major sources
+        # Check for missing major sources; timestamps are only formatted
+        # for sources that actually have zero periods
         major_sources = ['Fossil Gas', 'Nuclear', 'Coal and Lignite']
-        for source in major_sources:
-            if source in df_agg.columns:
-                zero_periods = df_agg[df_agg[source] == 0][source]
-                if not zero_periods.empty:
-                    issues.append(f"Found periods with zero {source} generation: {zero_periods.index.strftime('%Y-%m-%d %H:%M').tolist()}")
+        present = [source for source in major_sources if source in df_agg.columns]
+        zero_mask = df_agg[present].eq(0)
+        has_zero = zero_mask.any(axis=0)
+        for source in present:
+            if has_zero[source]:
+                zero_periods = df_agg.index[zero_mask[source].to_numpy()]
+                issues.append(f"Found periods with zero {source} generation: {zero_periods.strftime('%Y-%m-%d %H:%M').tolist()}")
         
         return issues
 
@@ -222,31 +356,30 @@ class EnergyDataAnalyzer:
         output_path: Path
     ) -> Tuple[Optional[pd.DataFrame], Optional[pd.DataFrame], Optional[Dict]]:
         """Analyze generation data for a specific country."""
-        latest_date = self.find_latest_data_date(country_code)
-        if not latest_date:
+        latest_date, df_recent = self.find_latest_data_date(country_code)
+        if latest_date is None:
             logger.error(f"No recent data found for {country_code}")
-            return None, None
+            return None, None, None
 
         start = latest_date - timedelta(days=10)
-        end = latest_date + timedelta(hours=1)
 
         try:
-            df_raw = self.client.query_generation(
-                country_code=country_code,
-                start=start,
-                end=end
-            )
+            # Reuse the lookback query rather than requesting the window again
+            df_raw = df_recent.loc[start:]
             
             if df_raw.empty:
                 logger.error(f"No data returned for {country_code}")
-                return None, None
+                return None, None, None
 
             df_gen = df_raw.xs("Actual Aggregated", axis=1, level=1)
             df_agg = self.aggregate_sources(df_gen)
             
-            # Calculate generation shares
-            total_gen = df_agg.sum(axis=1)
-            df_share = df_agg.div(total_gen, axis=0).fillna(0)
+            # Calculate generation shares (zero where there is no generation);
+            # missing readings count as zero, as in the pandas sum/fillna
+            arr = np.nan_to_num(df_agg.to_numpy(dtype=np.float32))
+            total_gen = arr.sum(axis=1)[:, None]
+            shares = np.divide(arr, total_gen, out=np.zeros_like(arr), where=total_gen != 0)
+            df_share = pd.DataFrame(shares, index=df_agg.index, columns=df_agg.columns)
             
             # Calculate statistics
             stats = self.calculate_statistics(df_agg)
@@ -281,25 +414,34 @@ def main():
     API_KEY = "yourentsoeapi"  # Replace with your API key
     analyzer = EnergyDataAnalyzer(API_KEY)
 
-    # Process each country
+    # Process each country; the API queries run concurrently while
+    # plotting stays on the main thread (matplotlib is not thread-safe)
     results = {}
-    for country_code, country_name in analyzer.countries.items():
-        logger.info(f"Processing {country_name}...")
-        
-        df_agg, df_share, stats = analyzer.analyze_country(country_code, output_path)
-        
-        if df_agg is not None and df_share is not None and stats is not None:
-            analyzer.create_generation_plot(df_agg, country_name, output_path, stats)
-            results[country_code] = {
-                'generation_mix': df_share.mean().round(3),
-                'statistics': stats
-            }
+    with ThreadPoolExecutor(max_workers=len(analyzer.countries)) as executor:
+        futures = {}
+        for country_code, country_name in analyzer.countries.items():
+            logger.info(f"Processing {country_name}...")
+            future = executor.submit(analyzer.analyze_country, country_code, output_path)
+            futures[future] = (country_code, country_name)
+
+        # Handle results in submission order so the output is deterministic
+        for future, (country_code, country_name) in futures.items():
+            df_agg, df_share, stats = future.result()
             
-            logger.info(f"Average generation mix for {country_name}:")
-            print(f"\n{country_name} Generation Mix:")
-            print((df_share.mean() * 100).sort_values(ascending=False).round(2).astype(str) + " %")
-        else:
-            logger.warning(f"Skipping visualization for {country_name} due to data issues")
+            if df_agg is not None and df_share is not None and stats is not None:
+                analyzer.create_generation_plot(df_agg, country_name, output_path, stats)
+                results[country_code] = {
+                    'generation_mix': df_share.mean().round(3),
+                    'statistics': stats
+                }
+                
+                logger.info(f"Average generation mix for {country_name}:")
+                print(f"\n{country_name} Generation Mix:")
+                print((df_share.mean() * 100).sort_values(ascending=False).round(2).astype(str) + " %")
+            else:
+                logger.warning(f"Skipping visualization for {country_name} due to data issues")
+
+    analyzer.close()
 
 if __name__ == "__main__":
     main()
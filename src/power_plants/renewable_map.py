@@ -1,6 +1,7 @@
 import pandas as pd
 import folium
 from folium.plugins import MarkerCluster
+from folium.utilities import JsCode
 from pathlib import Path
 import logging
 
@@ -27,8 +28,22 @@ class RenewablePowerPlantMap:
         """Load and filter the database for renewable plants in selected countries."""
         logger.info(f"Loading data from {file_path}")
         
-        # Read the CSV file with low_memory=False to avoid dtype warnings
-        df = pd.read_csv(file_path, low_memory=False)
+        # Read only the columns we use, with explicit dtypes so the
+        # filters below run on categorical/float columns directly
+        df = pd.read_csv(
+            file_path,
+            usecols=[
+                'country_long', 'primary_fuel', 'latitude', 'longitude',
+                'name', 'capacity_mw', 'commissioning_year'
+            ],
+            dtype={
+                'country_long': 'category',
+                'primary_fuel': 'category',
+                'capacity_mw': 'float32',
+                'latitude': 'float32',
+                'longitude': 'float32'
+            }
+        )
         
         # First, let's see what we have
         logger.info(f"\nUnique countries found: {df['country_long'].unique()}")
@@ -36,24 +51,24 @@ class RenewablePowerPlantMap:
         
         # Filter for our countries and renewable sources
         renewable_plants = df[
-            (df['country_long'].isin(self.countries.keys())) & 
+            (df['country_long'].isin(list(self.countries))) & 
             (df['primary_fuel'].isin(['Solar', 'Wind'])) &
             (df['latitude'].notna()) &  # Ensure we have coordinates
             (df['longitude'].notna())
-        ].copy()
+        ]
         
         # Add country names (in this case, they're the same)
-        renewable_plants['country_name'] = renewable_plants['country_long']
+        renewable_plants = renewable_plants.assign(
+            country_name=renewable_plants['country_long']
+        )
         
         logger.info(f"\nFound {len(renewable_plants)} renewable plants in selected countries")
         # Show distribution
-        for country in self.countries.keys():
-            country_data = renewable_plants[renewable_plants['country_long'] == country]
-            logger.info(f"\n{country}:")
-            for fuel_type in ['Solar', 'Wind']:
-                count = len(country_data[country_data['primary_fuel'] == fuel_type])
-                capacity = country_data[country_data['primary_fuel'] == fuel_type]['capacity_mw'].sum()
-                logger.info(f"  {fuel_type}: {count} plants, {capacity:.1f} MW total capacity")
+        stats = renewable_plants.groupby(
+            ['country_long', 'primary_fuel'], observed=True
+        )['capacity_mw'].agg(['size', 'sum'])
+        for (country, fuel_type), row in stats.iterrows():
+            logger.info(f"{country} {fuel_type}: {int(row['size'])} plants, {row['sum']:.1f} MW total capacity")
         
         return renewable_plants
 
@@ -79,47 +94,68 @@ class RenewablePowerPlantMap:
                 'color': 'orange'
             }
 
-            # Add country-specific clusters
-            for country_name in self.countries.keys():
-                country_data = df[df['country_long'] == country_name]
-                
-                if country_data.empty:
-                    continue
-                    
-                # Create separate clusters for solar and wind
-                for fuel_type in ['Solar', 'Wind']:
-                    fuel_data = country_data[country_data['primary_fuel'] == fuel_type]
-                    if fuel_data.empty:
-                        continue
-                    
-                    cluster = MarkerCluster(
-                        name=f"{country_name} {fuel_type} ({len(fuel_data)} plants)",
-                        overlay=True,
-                        control=True
-                    )
-
-                    # Add markers for each plant
-                    for _, plant in fuel_data.iterrows():
-                        # Create popup content
-                        popup_content = f"""
-                        <b>{plant['name']}</b><br>
-                        Country: {plant['country_name']}<br>
-                        Type: {plant['primary_fuel']}<br>
-                        Capacity: {plant['capacity_mw']:.1f} MW<br>
-                        Commission Year: {int(plant['commissioning_year']) if pd.notna(plant['commissioning_year']) else 'Unknown'}<br>
-                        """
-
-                        # Choose icon based on fuel type
-                        icon_dict = wind_icon if plant['primary_fuel'] == 'Wind' else solar_icon
-                        
-                        # Create marker with icon
-                        folium.Marker(
-                            location=[plant['latitude'], plant['longitude']],
-                            popup=popup_content,
-                            icon=folium.Icon(**icon_dict),
-                        ).add_to(cluster)
-
-                    cluster.add_to(m)
+            # Bind a popup to each plant marker. The popup can't go on the
+            # GeoJson layer itself: MarkerCluster only adds the child markers
+            # to the map, and Leaflet won't open a popup on an unmapped layer.
+            bind_popup = JsCode("""
+            function (feature, layer) {
+                var p = feature.properties;
+                layer.bindPopup(
+                    '<b>' + p.name + '</b><br>' +
+                    'Country: ' + p.country + '<br>' +
+                    'Type: ' + p.type + '<br>' +
+                    'Capacity: ' + p.capacity.toFixed(1) + ' MW<br>' +
+                    'Commission Year: ' + p.year + '<br>'
+                );
+            }
+            """)
+
+            # Add country/fuel-specific clusters, partitioning the rows once
+            groups = df.groupby(['country_long', 'primary_fuel'], observed=True, sort=False)
+            for (country_name, fuel_type), fuel_data in groups:
+                # Icon is constant per fuel type
+                icon_dict = wind_icon if fuel_type == 'Wind' else solar_icon
+
+                # Extract the needed columns once instead of boxing rows
+                names = fuel_data['name'].to_numpy()
+                lats = fuel_data['latitude'].to_numpy()
+                lons = fuel_data['longitude'].to_numpy()
+                caps = fuel_data['capacity_mw'].to_numpy()
+                years = fuel_data['commissioning_year'].to_numpy()
+                cnames = fuel_data['country_name'].to_numpy()
+
+                # Serialize the plants as one GeoJSON FeatureCollection
+                features = [
+                    {
+                        'type': 'Feature',
+                        'geometry': {
+                            'type': 'Point',
+                            'coordinates': [round(float(lon), 4), round(float(lat), 4)]
+                        },
+                        'properties': {
+                            'name': str(name),
+                            'country': str(cname),
+                            'type': fuel_type,
+                            'capacity': round(float(cap), 1),
+                            'year': int(year) if pd.notna(year) else 'Unknown'
+                        }
+                    }
+                    for name, lat, lon, cap, year, cname in zip(names, lats, lons, caps, years, cnames)
+                ]
+
+                cluster = MarkerCluster(
+                    name=f"{country_name} {fuel_type} ({len(fuel_data)} plants)",
+                    overlay=True,
+                    control=True
+                )
+
+                folium.GeoJson(
+                    {'type': 'FeatureCollection', 'features': features},
+                    marker=folium.Marker(icon=folium.Icon(**icon_dict)),
+                    on_each_feature=bind_popup
+                ).add_to(cluster)
+
+                cluster.add_to(m)
 
             # Add layer control
             folium.LayerControl().add_to(m)